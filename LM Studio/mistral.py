@@ -2,14 +2,22 @@ import requests
 
 url = "http://localhost:1234/v1/chat/completions"
 
-payload = {
-    "model": "Mistral-7B-Instruct-v0.3-Q4_K_M",
-    "messages": [{"role": "user", "content": "What is the capital of Quetta?"}]
-}
+# Reused across calls so the connection to LM Studio is kept alive
+SESSION = requests.Session()
 
-response = requests.post(url, json=payload)
-data = response.json()
 
-reply = data['choices'][0]['message']['content']
+def ask(prompt):
+    payload = {
+        "model": "Mistral-7B-Instruct-v0.3-Q4_K_M",
+        "messages": [{"role": "user", "content": prompt}]
+    }
 
-print("Mistral response:",reply)
+    response = SESSION.post(url, json=payload, timeout=(3, 60))
+    data = response.json()
+
+    return data['choices'][0]['message']['content']
+
+
+if __name__ == "__main__":
+    reply = ask("What is the capital of Quetta?")
+    print("Mistral response:",reply)
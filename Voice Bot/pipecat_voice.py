@@ -1,9 +1,15 @@
 import asyncio
+import gzip
+import hashlib
+import itertools
 import os
-import json
-import uuid
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
 from aiohttp import web
 import aiohttp
+import orjson
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -11,85 +17,286 @@ BASE_URL = os.getenv("BASE_URL", "http://127.0.0.1:1234/v1")
 MODEL_NAME = os.getenv("MODEL_NAME", "local-model")
 API_KEY = os.getenv("API_KEY", "not-needed")
 
-# Store connected clients and their conversations
-clients = {}
-conversations = {}
+# Identical leading tokens on every request let the server reuse its prompt cache
+SYSTEM_MSG = {"role": "system", "content": "You are a helpful voice assistant. Keep responses brief (1-2 sentences)."}
+# End generation when the model starts writing the next turn or pads with blank lines
+STOP_SEQUENCES = ["\nUser:", "\n\n\n"]
 
+# Streamed tokens are coalesced into one WebSocket frame per batch
+TOKEN_BATCH_INTERVAL = 0.02  # seconds
+TOKEN_BATCH_CHARS = 64
+# Punctuation only ends a sentence once whitespace follows, so "3." + "5" stays in one batch
+SENTENCE_BREAK = re.compile(r"[.!?]\s|\n")
 
-async def get_llm_response(session_id: str, user_text: str) -> str:
-    if session_id not in conversations:
-        conversations[session_id] = []
+# Conversation history grows append-only, so every request extends the previous one
+# and the server's prefix cache stays valid. Only once it reaches MAX_HISTORY_RESET
+# messages or MAX_HISTORY_TOKENS estimated tokens is it cut back in one step, to the
+# last MAX_HISTORY messages within half the token budget.
+MAX_HISTORY = 20
+MAX_HISTORY_RESET = 2 * MAX_HISTORY
+MAX_HISTORY_TOKENS = 2048
+
+# LRU cache of replies keyed by the message window; only used for short conversations
+RESPONSE_CACHE_SIZE = 256
+RESPONSE_CACHE_MAX_HISTORY = 6
+
+# Shared LLM ClientSession, created in main()
+HTTP_KEY = web.AppKey("http", aiohttp.ClientSession)
+
+response_cache = OrderedDict()
+session_counter = itertools.count()
+
+
+@dataclass
+class Session:
+    """Per-connection state, owned by its WebSocket handler"""
+    id: str
+    ws: web.WebSocketResponse
+    history: list = field(default_factory=list)
+    # Digest the next request's prefix (everything before the new user turn) should have
+    prefix_digest: str | None = None
+    # Turns (replies, clears) run as tasks one at a time, in arrival order, under this lock
+    # so the handler keeps reading the socket; they're cancelled when the client disconnects
+    turn_lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    turns: set = field(default_factory=set)
     
-    conversations[session_id].append({"role": "user", "content": user_text})
+    def add_turn(self, user_msg: dict, response: str):
+        """Record a completed exchange"""
+        self.history.extend((user_msg, {"role": "assistant", "content": response}))
+        self.prefix_digest = digest_messages([SYSTEM_MSG, *self.history])
     
-    if len(conversations[session_id]) == 1:
-        messages = [
-            {"role": "user", "content": f"[You are a helpful voice assistant. Keep responses brief (1-2 sentences).]\n\n{user_text}"}
-        ]
-    else:
-        # Subsequent messages: use conversation history as-is
-        messages = conversations[session_id].copy()
+    def clear(self):
+        self.history.clear()
+        self.prefix_digest = None
+    
+    def start_turn(self, coro):
+        """Run coro as a task after the turns already queued for this session"""
+        task = asyncio.create_task(coro)
+        self.turns.add(task)
+        task.add_done_callback(self.turn_done)
+    
+    def turn_done(self, task: asyncio.Task):
+        self.turns.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"⚠️ [{self.id}] Turn failed: {task.exception()!r}")
+    
+    def trim(self) -> bool:
+        """Cut the history back once it outgrows its limits; returns True if it did"""
+        if len(self.history) < MAX_HISTORY_RESET and estimate_tokens(self.history) <= MAX_HISTORY_TOKENS:
+            return False
+        # History holds user/assistant pairs, so dropping pairs keeps it starting on a user turn
+        del self.history[:-MAX_HISTORY]
+        while self.history and estimate_tokens(self.history) > MAX_HISTORY_TOKENS // 2:
+            del self.history[:2]
+        return True
+
+
+def dumps(obj) -> str:
+    """orjson-backed JSON encoder for aiohttp (which expects str, not bytes)"""
+    return orjson.dumps(obj).decode()
+
+
+# Schema-stable frames are encoded once instead of per send
+CONNECTED_PRE = '{"type":"connected","session_id":"'
+CONNECTED_POST = '"}'
+RESPONSE_END = dumps({"type": "response_end"})
+HISTORY_CLEARED = dumps({"type": "history_cleared"})
+
+
+def estimate_tokens(messages) -> int:
+    """Rough token count (~4 characters per token)"""
+    return sum(len(m["content"]) // 4 for m in messages)
+
+
+def digest_messages(messages) -> str:
+    """Short hash of the serialized messages, for checking prefix stability"""
+    return hashlib.sha1(orjson.dumps(messages)).hexdigest()[:12]
+
+
+def parse_delta(payload: bytes) -> str | None:
+    """Text content of one streamed completion chunk, or None if it has none"""
+    # Skip anything that isn't a well-formed chunk rather than failing the turn
+    try:
+        chunk = orjson.loads(payload)
+    except orjson.JSONDecodeError:
+        return None
+    choices = chunk.get("choices") if isinstance(chunk, dict) else None
+    choice = choices[0] if isinstance(choices, list) and choices else None
+    chunk_delta = choice.get("delta") if isinstance(choice, dict) else None
+    delta = chunk_delta.get("content") if isinstance(chunk_delta, dict) else None
+    return delta if isinstance(delta, str) else None
+
+
+async def get_llm_response(http: aiohttp.ClientSession, sess: Session, user_text: str) -> str:
+    """Stream the LLM reply to the client token by token and return the full text"""
+    ws = sess.ws
+    user_msg = {"role": "user", "content": user_text}
+    
+    reset = sess.trim()
+    messages = [SYSTEM_MSG, *sess.history, user_msg]
+    
+    # Between resets the prompt must extend the previous one, or the server's prefix cache is lost
+    prefix_digest = digest_messages(messages[:-1])
+    if sess.prefix_digest and not reset and prefix_digest != sess.prefix_digest:
+        print(f"⚠️ [{sess.id}] Prefix cache broken: {sess.prefix_digest} -> {prefix_digest}")
+    
+    cacheable = len(sess.history) < RESPONSE_CACHE_MAX_HISTORY
+    if cacheable:
+        cache_key = hashlib.blake2b(orjson.dumps(messages), digest_size=16).digest()
+        response = response_cache.get(cache_key)
+        if response is not None:
+            response_cache.move_to_end(cache_key)
+            await ws.send_json({"type": "token_batch", "text": response}, dumps=dumps)
+            sess.add_turn(user_msg, response)
+            return response
+    
+    parts = []
+    buf = []
+    buf_len = 0
+    batch_start = 0.0
+    prev_char = ""
+    
+    async def flush():
+        nonlocal buf_len
+        text = "".join(buf)
+        buf.clear()
+        buf_len = 0
+        await ws.send_json({"type": "token_batch", "text": text}, dumps=dumps)
     
     try:
-        async with aiohttp.ClientSession() as http:
-            headers = {"Authorization": f"Bearer {API_KEY}"} if API_KEY else {}
-            async with http.post(
-                f"{BASE_URL}/chat/completions",
-                json={"model": MODEL_NAME, "messages": messages, "max_tokens": 150},
-                headers=headers
-            ) as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    response = data["choices"][0]["message"]["content"]
-                    conversations[session_id].append({"role": "assistant", "content": response})
-                    return response
-                else:
-                    return f"Error: LLM returned status {resp.status}"
-    except Exception as e:
-        return f"Error connecting to LLM: {e}"
+        headers = {"Content-Type": "application/json"}
+        if API_KEY:
+            headers["Authorization"] = f"Bearer {API_KEY}"
+        async with http.post(
+            f"{BASE_URL}/chat/completions",
+            data=orjson.dumps({
+                "model": MODEL_NAME,
+                "messages": messages,
+                "max_tokens": 150,
+                "stop": STOP_SEQUENCES,
+                "stream": True
+            }),
+            headers=headers
+        ) as resp:
+            if resp.status != 200:
+                error = f"Error: LLM returned status {resp.status}"
+                await ws.send_json({"type": "token_batch", "text": error}, dumps=dumps)
+                return error
+            # Server-sent events: one "data: {...}" line per chunk, ending with "data: [DONE]".
+            # Lines are split here because readany() can be timed out without losing a
+            # partial line, which lets a batch be flushed when its window runs out.
+            pending = b""
+            done = False
+            while not done:
+                timeout = max(0.0, batch_start + TOKEN_BATCH_INTERVAL - time.monotonic()) if buf else None
+                try:
+                    data = await asyncio.wait_for(resp.content.readany(), timeout)
+                except asyncio.TimeoutError:
+                    await flush()
+                    continue
+                if ws.closed:
+                    # Client left mid-reply: drop the connection so the LLM stops generating,
+                    # and don't record or cache the turn for a dead session
+                    resp.close()
+                    return "".join(parts)
+                if not data:
+                    break
+                *lines, pending = (pending + data).split(b"\n")
+                for line in lines:
+                    line = line.strip()
+                    if not line.startswith(b"data:"):
+                        continue
+                    payload = line[5:].strip()
+                    if payload == b"[DONE]":
+                        done = True
+                        break
+                    delta = parse_delta(payload)
+                    if not delta:
+                        continue
+                    parts.append(delta)
+                    # The break can straddle two deltas ("done." + " Next"), so include the last char
+                    ends_sentence = SENTENCE_BREAK.search(prev_char + delta) is not None
+                    prev_char = delta[-1]
+                    if not buf:
+                        batch_start = time.monotonic()
+                    buf.append(delta)
+                    buf_len += len(delta)
+                    # The first delta goes out at once; later ones wait for the batch to fill
+                    if (len(parts) == 1 or ends_sentence or buf_len > TOKEN_BATCH_CHARS
+                            or time.monotonic() - batch_start >= TOKEN_BATCH_INTERVAL):
+                        await flush()
+            if buf:
+                await flush()
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        error = f"Error connecting to LLM: {e}"
+        # Don't drop tokens that were buffered when the stream failed, and keep the
+        # error apart from any text the user has already seen
+        sep = " " if parts else ""
+        await ws.send_json({"type": "token_batch", "text": "".join(buf) + sep + error}, dumps=dumps)
+        return error
+    
+    # History only grows once the turn has succeeded with an actual reply
+    response = "".join(parts)
+    if not response:
+        return response
+    sess.add_turn(user_msg, response)
+    if cacheable:
+        response_cache[cache_key] = response
+        if len(response_cache) > RESPONSE_CACHE_SIZE:
+            response_cache.popitem(last=False)
+    return response
+
+
+async def reply(http: aiohttp.ClientSession, sess: Session, user_text: str):
+    """Answer one user message"""
+    async with sess.turn_lock:
+        response = await get_llm_response(http, sess, user_text)
+        print(f"🤖 [{sess.id}] Bot: {response}")
+        await sess.ws.send_str(RESPONSE_END)
+
+
+async def clear_history(sess: Session):
+    """Clear conversation history for this session"""
+    async with sess.turn_lock:
+        sess.clear()
+        print(f"🗑️ [{sess.id}] History cleared")
+        await sess.ws.send_str(HISTORY_CLEARED)
 
 
 async def handle_websocket(request):
     """Handle WebSocket connections"""
-    ws = web.WebSocketResponse()
+    # The heartbeat closes dead peers so their session is released, and user messages
+    # are small so inbound frames are capped (permessage-deflate is on by default)
+    ws = web.WebSocketResponse(max_msg_size=65536, heartbeat=20)
     await ws.prepare(request)
     
-    session_id = str(uuid.uuid4())[:8]
-    clients[session_id] = ws
-    print(f"✅ Client connected: {session_id}")
+    sess = Session(id=f"{next(session_counter):08x}", ws=ws)
+    print(f"✅ Client connected: {sess.id}")
     
-    await ws.send_json({"type": "connected", "session_id": session_id})
+    await ws.send_str(CONNECTED_PRE + sess.id + CONNECTED_POST)
     
     try:
         async for msg in ws:
-            if msg.type == aiohttp.WSMsgType.TEXT:
-                data = json.loads(msg.data)
+            # The page sends UTF-8 JSON as binary frames, which skips text-frame validation
+            if msg.type in (aiohttp.WSMsgType.TEXT, aiohttp.WSMsgType.BINARY):
+                data = orjson.loads(msg.data)
+                # Never await a turn here: the loop has to keep reading so a close frame
+                # is seen (and the turns cancelled) while the LLM is still generating
                 if data.get("type") == "text":
                     user_text = data.get("text", "")
-                    print(f"🎤 [{session_id}] User: {user_text}")
-                    
-                    response = await get_llm_response(session_id, user_text)
-                    print(f"🤖 [{session_id}] Bot: {response}")
-                    
-                    await ws.send_json({"type": "response", "text": response})
+                    print(f"🎤 [{sess.id}] User: {user_text}")
+                    sess.start_turn(reply(request.app[HTTP_KEY], sess, user_text))
                 elif data.get("type") == "clear":
-                    # Clear conversation history for this session
-                    if session_id in conversations:
-                        conversations[session_id] = []
-                    print(f"🗑️ [{session_id}] History cleared")
-                    await ws.send_json({"type": "history_cleared"})
+                    sess.start_turn(clear_history(sess))
     finally:
-        del clients[session_id]
-        if session_id in conversations:
-            del conversations[session_id]
-        print(f"❌ Client disconnected: {session_id}")
+        for task in sess.turns:
+            task.cancel()
+        print(f"❌ Client disconnected: {sess.id}")
     
     return ws
 
 
-async def handle_index(request):
-    """Serve the HTML interface"""
-    html = '''<!DOCTYPE html>
+INDEX_HTML = '''<!DOCTYPE html>
 <html>
 <head>
     <title>Voice Bot</title>
@@ -160,6 +367,8 @@ async def handle_index(request):
         let ws, recognition, synthesis = window.speechSynthesis;
         let isListening = false, isSpeaking = false;
         let messageCount = 0;
+        let botDiv = null, botText = '', spokenUpTo = 0, pendingUtterances = 0, speechMuted = false;
+        let pendingDiv = null, pendingText = '', renderScheduled = false;
         function loadVoice(){
             const voices = synthesis.getVoices();
             const currentValue = voiceSelect.value;
@@ -220,47 +429,129 @@ loadVoice();
             }
         }
         
-        function speak(text) {
-            if (!autoSpeak.checked || !synthesis) {
-                // If not speaking, start listening immediately in continuous mode
-                if (continuousMode.checked) {
-                    setTimeout(startListening, 300);
-                }
-                return;
+        function doneSpeaking() {
+            isSpeaking = false;
+            micBtn.classList.remove('speaking');
+            micBtn.textContent = '🎤';
+            // Auto-start listening in continuous mode
+            if (continuousMode.checked) {
+                voiceStatus.textContent = 'Starting to listen...';
+                setTimeout(startListening, 500);
+            } else {
+                voiceStatus.textContent = 'Click mic to speak';
             }
-            synthesis.cancel();
-             const utterance = new SpeechSynthesisUtterance(text);
-             utterance.rate = 1.0;
-             utterance.pitch = 1.2;
-             const voices = synthesis.getVoices();
-             utterance.voice = voices[voiceSelect.value];
-             utterance.onstart = () => {
+        }
+        
+        function speak(text) {
+            const utterance = new SpeechSynthesisUtterance(text);
+            utterance.rate = 1.0;
+            utterance.pitch = 1.2;
+            const voices = synthesis.getVoices();
+            utterance.voice = voices[voiceSelect.value];
+            utterance.onstart = () => {
                 isSpeaking = true;
                 micBtn.classList.add('speaking');
                 micBtn.textContent = '🔊';
                 voiceStatus.textContent = 'Speaking...';
             };
-            utterance.onend = () => {
-                isSpeaking = false;
-                micBtn.classList.remove('speaking');
-                micBtn.textContent = '🎤';
-                // Auto-start listening in continuous mode
+            // Utterances queue up in speechSynthesis; only resume listening after the last one
+            utterance.onend = utterance.onerror = () => {
+                pendingUtterances--;
+                if (pendingUtterances === 0 && !botDiv) doneSpeaking();
+            };
+            pendingUtterances++;
+            synthesis.speak(utterance);
+        }
+        
+        // Where the unspoken text can be cut for speech: after the last finished sentence,
+        // after a comma once the clause has 4+ words, or at a word break past ~80 tokens
+        const MAX_SPEECH_CHARS = 320;
+        // A period after these (or after a single capital initial) doesn't end a sentence
+        const ABBREVIATION = /(\\b(Mr|Mrs|Ms|Dr|Prof|St|Jr|Sr|vs|etc|e\\.g|i\\.e)|\\b[A-Z])\\.$/;
+        function sentenceEnd(text) {
+            // Mid-stream, punctuation only ends a sentence once whitespace follows it, so a
+            // batch ending in "3." isn't cut before "5"; speakSentences(true) handles the end
+            let end = 0;
+            for (const m of text.matchAll(/[.!?]\\s/g)) {
+                if (m[0][0] === '.' && ABBREVIATION.test(text.slice(0, m.index + 1))) continue;
+                end = m.index + m[0].length;
+            }
+            return end;
+        }
+        
+        function speechBoundary(text) {
+            const sentence = sentenceEnd(text);
+            if (sentence) return sentence;
+            const clause = text.match(/^[\\s\\S]*,\\s/);
+            if (clause && clause[0].trim().split(/\\s+/).length >= 4) return clause[0].length;
+            if (text.length >= MAX_SPEECH_CHARS) return text.lastIndexOf(' ') + 1;
+            return 0;
+        }
+        
+        function speakSentences(final) {
+            if (speechMuted || !autoSpeak.checked || !synthesis) return;
+            const rest = botText.slice(spokenUpTo);
+            // Speak the next ready chunk, or everything once the reply is complete
+            const end = final ? rest.length : speechBoundary(rest);
+            if (!end) return;
+            spokenUpTo += end;
+            const sentence = rest.slice(0, end).trim();
+            if (sentence) speak(sentence);
+        }
+        
+        // Streamed text is written to the DOM at most once per animation frame
+        function flushRender() {
+            renderScheduled = false;
+            if (!pendingText) return;
+            pendingDiv.textContent += pendingText;
+            pendingText = '';
+            chat.scrollTop = chat.scrollHeight;
+        }
+        
+        function addTokens(text) {
+            if (!botDiv) {
+                synthesis.cancel();
+                botDiv = document.createElement('div');
+                botDiv.className = 'message bot';
+                chat.appendChild(botDiv);
+                botText = '';
+                spokenUpTo = 0;
+                speechMuted = false;
+                updateHistoryCount();
+            }
+            botText += text;
+            if (pendingDiv !== botDiv) {
+                flushRender();
+                pendingDiv = botDiv;
+            }
+            pendingText += text;
+            if (!renderScheduled) {
+                renderScheduled = true;
+                requestAnimationFrame(flushRender);
+            }
+            speakSentences(false);
+        }
+        
+        function endResponse() {
+            if (!botDiv) {
+                // Empty reply: nothing to show or speak, so go straight back to listening
                 if (continuousMode.checked) {
-                    voiceStatus.textContent = 'Starting to listen...';
-                    setTimeout(startListening, 500);
+                    setTimeout(startListening, 300);
                 } else {
                     voiceStatus.textContent = 'Click mic to speak';
                 }
-            };
-            utterance.onerror = () => {
-                isSpeaking = false;
-                micBtn.classList.remove('speaking');
-                micBtn.textContent = '🎤';
-                if (continuousMode.checked) {
-                    setTimeout(startListening, 500);
+                return;
+            }
+            speakSentences(true);
+            botDiv = null;
+            if (pendingUtterances === 0) {
+                if (isSpeaking) {
+                    doneSpeaking();
+                } else if (continuousMode.checked) {
+                    // If not speaking, start listening immediately in continuous mode
+                    setTimeout(startListening, 300);
                 }
-            };
-            synthesis.speak(utterance);
+            }
         }
         
         function updateHistoryCount() {
@@ -277,15 +568,20 @@ loadVoice();
             updateHistoryCount();
         }
         
+        const encoder = new TextEncoder();
+        function send(data) {
+            ws.send(encoder.encode(JSON.stringify(data)));
+        }
+        
         function sendMessage(text) {
             if (!text || !ws) return;
             addMessage(text, true);
-            ws.send(JSON.stringify({type: 'text', text}));
+            send({type: 'text', text});
         }
         
         function clearHistory() {
             if (ws && ws.readyState === WebSocket.OPEN) {
-                ws.send(JSON.stringify({type: 'clear'}));
+                send({type: 'clear'});
                 chat.innerHTML = '';
                 messageCount = 0;
                 historyCount.textContent = 'Messages: 0';
@@ -307,9 +603,10 @@ loadVoice();
             
             ws.onmessage = (e) => {
                 const data = JSON.parse(e.data);
-                if (data.type === 'response') {
-                    addMessage(data.text, false);
-                    speak(data.text);
+                if (data.type === 'token_batch') {
+                    addTokens(data.text);
+                } else if (data.type === 'response_end') {
+                    endResponse();
                 } else if (data.type === 'history_cleared') {
                     chat.innerHTML = '';
                     messageCount = 0;
@@ -328,7 +625,7 @@ loadVoice();
         }
         
         micBtn.onclick = () => {
-            if (isSpeaking) { synthesis.cancel(); return; }
+            if (isSpeaking) { speechMuted = true; synthesis.cancel(); return; }
             if (isListening) recognition.stop();
             else if (recognition) startListening();
         };
@@ -341,7 +638,36 @@ loadVoice();
     </script>
 </body>
 </html>'''
-    return web.Response(text=html, content_type='text/html')
+# Encoded (and gzipped) once at import instead of on every request
+INDEX_BYTES = INDEX_HTML.encode()
+INDEX_GZ = gzip.compress(INDEX_BYTES, 6)
+
+
+async def handle_index(request):
+    """Serve the HTML interface"""
+    headers = {
+        'Content-Type': 'text/html; charset=utf-8',
+        'Cache-Control': 'public, max-age=3600',
+        'Vary': 'Accept-Encoding'
+    }
+    if 'gzip' in request.headers.get('Accept-Encoding', ''):
+        headers['Content-Encoding'] = 'gzip'
+        return web.Response(body=INDEX_GZ, headers=headers)
+    return web.Response(body=INDEX_BYTES, headers=headers)
+
+
+async def check_llm(http: aiohttp.ClientSession) -> bool:
+    """Quick reachability check so the startup banner can't hang on a dead server"""
+    try:
+        async with http.get(f"{BASE_URL}/models", timeout=aiohttp.ClientTimeout(total=2)) as resp:
+            return resp.status == 200
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        return False
+
+
+async def close_http_session(app):
+    """Close the shared LLM HTTP session on shutdown"""
+    await app[HTTP_KEY].close()
 
 
 async def main():
@@ -349,7 +675,15 @@ async def main():
     app.router.add_get('/', handle_index)
     app.router.add_get('/ws', handle_websocket)
     
-    runner = web.AppRunner(app)
+    # One pooled session for all LLM calls so connections to the server stay alive
+    app[HTTP_KEY] = aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=32, keepalive_timeout=75),
+        timeout=aiohttp.ClientTimeout(total=60)
+    )
+    app.on_cleanup.append(close_http_session)
+    
+    # No per-request access logging; the session prints above are enough for this server
+    runner = web.AppRunner(app, access_log=None)
     await runner.setup()
     site = web.TCPSite(runner, 'localhost', 8765)
     await site.start()
@@ -358,12 +692,24 @@ async def main():
     print("="*50)
     print(f"🌐 Open in browser: http://localhost:8765")
     print(f"🔗 LLM API: {BASE_URL}")
+    if await check_llm(app[HTTP_KEY]):
+        print("✅ LLM server reachable")
+    else:
+        print("⚠️  LLM server not reachable")
     print("="*50)
     print("Press Ctrl+C to stop\n")
-    await asyncio.Event().wait()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
 
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        from uvloop import run
+    except ImportError:
+        # uvloop is not available on Windows, keep the default event loop
+        run = asyncio.run
+    try:
+        run(main())
     except KeyboardInterrupt:
         print("Shutting down server...")
\ No newline at end of file